@@ -3,15 +3,22 @@ Whisper Transcription Service
 FastAPI server for self-hosted audio transcription
 """
 
+import gc
+import io
 import os
 import time
-import tempfile
-from typing import Optional
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional, Union
 from pathlib import Path
 
+import av
+import numpy as np
 import whisper
 import torch
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import BackgroundTasks, FastAPI, File, UploadFile, Form, HTTPException
 from fastapi.responses import JSONResponse
 from prometheus_client import Counter, Histogram, Gauge, generate_latest
 from prometheus_client.core import CollectorRegistry
@@ -20,7 +27,21 @@ from prometheus_client.core import CollectorRegistry
 WHISPER_MODEL = os.getenv("WHISPER_MODEL", "medium")
 USE_CPU = os.getenv("USE_CPU", "false").lower() == "true"
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "50")) * 1024 * 1024  # 50MB default
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB reads while checking upload size
 LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "1"))  # uvicorn processes, one model each
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "8"))
+MAX_BATCH_WAIT_MS = int(os.getenv("MAX_BATCH_WAIT_MS", "50"))
+USE_COMPILE = os.getenv("USE_COMPILE", "false").lower() == "true"
+STREAM_OVERLAP_MS = int(os.getenv("STREAM_OVERLAP_MS", "1000"))
+STREAM_SESSION_TTL = int(os.getenv("STREAM_SESSION_TTL", "300"))  # seconds
+MAX_STREAM_SESSIONS = int(os.getenv("MAX_STREAM_SESSIONS", "256"))
+CACHE_FLUSH_INTERVAL = int(os.getenv("CACHE_FLUSH_INTERVAL", "64"))  # batches
+CUDA_MEMORY_FRACTION = float(os.getenv("CUDA_MEMORY_FRACTION", "0"))  # 0 = no cap
+MODEL_CACHE_DIR = Path(os.getenv("MODEL_CACHE_DIR", "/cache"))
+
+# Must be set before inductor is first imported so compiled kernels persist too
+os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(MODEL_CACHE_DIR / "inductor"))
 
 # Initialize FastAPI
 app = FastAPI(
@@ -52,6 +73,12 @@ model_loaded = Gauge(
     "Whether Whisper model is loaded",
     registry=registry,
 )
+batch_size = Histogram(
+    "whisper_batch_size",
+    "Number of requests decoded per batch",
+    buckets=(1, 2, 4, 8, 16, 32),
+    registry=registry,
+)
 
 # Global model (loaded once at startup)
 model = None
@@ -59,14 +86,554 @@ device = "cuda" if torch.cuda.is_available() and not USE_CPU else "cpu"
 start_time = time.time()
 
 
+def decode_audio(content: Union[bytes, bytearray]) -> np.ndarray:
+    """
+    Decode an uploaded audio file in memory to 16kHz mono float32
+
+    Uses PyAV (libav bindings) on the raw bytes, so no temp file or
+    ffmpeg subprocess is needed per request
+    """
+    resampler = av.audio.resampler.AudioResampler(
+        format="s16", layout="mono", rate=whisper.audio.SAMPLE_RATE
+    )
+    chunks = []
+
+    with av.open(io.BytesIO(content), mode="r", metadata_errors="ignore") as container:
+        for frame in container.decode(audio=0):
+            chunks.extend(f.to_ndarray() for f in resampler.resample(frame))
+        # Flush samples buffered inside the resampler
+        chunks.extend(f.to_ndarray() for f in resampler.resample(None))
+
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+
+    return np.concatenate(chunks, axis=1).reshape(-1).astype(np.float32) / 32768.0
+
+
+@dataclass
+class BatchItem:
+    """A single queued transcription request"""
+    content: Optional[bytes] = field(repr=False)
+    language: Optional[str]
+    temperature: float
+    prompt: Optional[Union[str, List[int]]]
+    future: asyncio.Future = field(repr=False)
+    # Already decoded 16kHz audio (streamed chunks), used instead of content
+    audio: Optional[np.ndarray] = field(default=None, repr=False)
+
+
+class BatchScheduler:
+    """
+    Dynamic request batching for Whisper
+
+    Requests are queued and a background worker collects up to
+    max_batch_size of them (or waits at most max_wait_ms), then runs
+    each group through one batched encoder + decoder pass and resolves
+    the per-request futures.
+
+    Whisper's encoder only accepts full 30s windows, so clips that fit in
+    one window are padded to 30s and bucketed by decoding options
+    (language, temperature, prompt). Longer clips need the sliding-window
+    loop in model.transcribe and are decoded individually.
+    """
+
+    def __init__(self, max_batch_size: int = 8, max_wait_ms: int = 50):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.batches_since_flush = 0
+        # All model calls run on one dedicated thread: whisper's kv-cache hooks
+        # are not thread safe and CUDA graphs are captured per thread
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper")
+
+    def start(self):
+        """Start the background worker on the running event loop"""
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background worker"""
+        if self.worker:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+
+    def submit(
+        self,
+        content: Optional[bytes],
+        language: Optional[str] = None,
+        temperature: float = 0.0,
+        prompt: Optional[Union[str, List[int]]] = None,
+        audio: Optional[np.ndarray] = None,
+    ) -> asyncio.Future:
+        """
+        Queue a request; the returned future resolves to a transcribe() style dict
+
+        prompt may be text or previous-context token ids. Pass audio instead of
+        content when the waveform is already decoded.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait(
+            BatchItem(content, language, temperature or 0.0, prompt, future, audio)
+        )
+        return future
+
+    async def _collect(self) -> list:
+        """Wait for one request, then gather more until the batch is full or the window closes"""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            batch_size.observe(len(batch))
+            batch = [item for item in batch if not item.future.done()]
+
+            # Decoding runs in a worker thread so the event loop keeps accepting
+            # requests; futures are resolved back on the loop
+            outcomes = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self._process, batch
+            )
+
+            for item, outcome in outcomes:
+                if item.future.done():
+                    continue
+                if isinstance(outcome, Exception):
+                    item.future.set_exception(outcome)
+                else:
+                    item.future.set_result(outcome)
+
+            # Hand cached blocks back to the driver every N batches so the other
+            # models on this GPU can use them. Per request would defeat the
+            # caching allocator.
+            self.batches_since_flush += 1
+            if self.batches_since_flush >= CACHE_FLUSH_INTERVAL:
+                self.batches_since_flush = 0
+                await asyncio.get_running_loop().run_in_executor(
+                    self.executor, release_memory
+                )
+
+    def _process(self, batch: list) -> list:
+        """Bucket a collected batch and decode it, returning (item, result or exception) pairs"""
+        outcomes = []
+        buckets = {}
+
+        for item in batch:
+            try:
+                audio = item.audio if item.audio is not None else decode_audio(item.content)
+            except Exception as e:
+                outcomes.append((item, e))
+                continue
+
+            if audio.shape[0] > whisper.audio.N_SAMPLES:
+                try:
+                    outcomes.append((item, self._transcribe_long(item, audio)))
+                except Exception as e:
+                    outcomes.append((item, e))
+            else:
+                prompt = tuple(item.prompt) if isinstance(item.prompt, list) else item.prompt
+                key = (item.language, item.temperature, prompt)
+                buckets.setdefault(key, []).append((item, audio))
+
+        for (language, temperature, prompt), entries in buckets.items():
+            try:
+                results = self._decode_batch(
+                    [audio for _, audio in entries], language, temperature, prompt
+                )
+            except Exception as e:
+                results = [e] * len(entries)
+
+            outcomes.extend((item, result) for (item, _), result in zip(entries, results))
+
+        return outcomes
+
+    @staticmethod
+    def _transcribe_long(item: BatchItem, audio) -> dict:
+        """Fall back to the sliding-window decoder for clips over 30s"""
+        result = model.transcribe(
+            audio,
+            language=item.language,
+            temperature=item.temperature,
+            initial_prompt=item.prompt,
+            verbose=False,
+        )
+        result["duration"] = audio.shape[0] / whisper.audio.SAMPLE_RATE
+        return result
+
+    @staticmethod
+    def _decode_batch(audios: list, language, temperature, prompt) -> list:
+        """Pad clips to one 30s window, stack to [B, n_mels, T] and decode in a single pass"""
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(
+                whisper.pad_or_trim(audio),
+                n_mels=model.dims.n_mels,
+                device=model.device,
+            )
+            for audio in audios
+        ])
+
+        options = whisper.DecodingOptions(
+            language=language,
+            temperature=temperature,
+            prompt=list(prompt) if isinstance(prompt, tuple) else prompt,
+            fp16=device == "cuda",
+        )
+        decoded = whisper.decode(model, mel, options)
+
+        results = []
+        for audio, result in zip(audios, decoded):
+            duration = audio.shape[0] / whisper.audio.SAMPLE_RATE
+            # Same silence heuristic as model.transcribe
+            is_silent = result.no_speech_prob > 0.6 and result.avg_logprob < -1.0
+            segments = [] if is_silent else BatchScheduler._split_segments(result, duration)
+
+            results.append({
+                "text": "" if is_silent else result.text,
+                "language": result.language,
+                "duration": duration,
+                "segments": segments,
+            })
+
+        return results
+
+    @staticmethod
+    def _split_segments(result, duration: float) -> list:
+        """
+        Split one decoded window into timestamped segments
+
+        Mirrors model.transcribe: a pair of consecutive timestamp tokens ends a
+        segment; without any pair the window is one segment ending at the last
+        timestamp (or the clip duration).
+        """
+        tokenizer = whisper.tokenizer.get_tokenizer(
+            model.is_multilingual,
+            num_languages=model.num_languages,
+            language=result.language,
+            task="transcribe",
+        )
+        time_precision = whisper.audio.HOP_LENGTH * 2 / whisper.audio.SAMPLE_RATE
+        tokens = result.tokens
+        is_timestamp = [t >= tokenizer.timestamp_begin for t in tokens]
+
+        slices = [i + 1 for i in range(len(tokens) - 1) if is_timestamp[i] and is_timestamp[i + 1]]
+        if slices and is_timestamp[-2:] == [False, True]:
+            slices.append(len(tokens))
+
+        if slices:
+            spans = []
+            last = 0
+            for current in slices:
+                sliced = tokens[last:current]
+                spans.append((
+                    (sliced[0] - tokenizer.timestamp_begin) * time_precision,
+                    (sliced[-1] - tokenizer.timestamp_begin) * time_precision,
+                    sliced,
+                ))
+                last = current
+        else:
+            end = duration
+            timestamps = [t for t, ts in zip(tokens, is_timestamp) if ts]
+            if timestamps and timestamps[-1] != tokenizer.timestamp_begin:
+                end = (timestamps[-1] - tokenizer.timestamp_begin) * time_precision
+            spans = [(0.0, end, tokens)]
+
+        return [
+            {
+                "id": i,
+                "seek": 0,
+                "start": start,
+                "end": end,
+                "text": tokenizer.decode([t for t in sliced if t < tokenizer.eot]),
+                "tokens": list(sliced),
+                "temperature": result.temperature,
+                "avg_logprob": result.avg_logprob,
+                "compression_ratio": result.compression_ratio,
+                "no_speech_prob": result.no_speech_prob,
+            }
+            for i, (start, end, sliced) in enumerate(spans)
+        ]
+
+
+scheduler = BatchScheduler(MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS)
+
+
+@dataclass
+class StreamSession:
+    """Decoder context carried between chunks of one streamed utterance"""
+    tail: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float32), repr=False)
+    tokens: List[int] = field(default_factory=list)
+    text: List[str] = field(default_factory=list)
+    language: Optional[str] = None
+    last_seen: float = field(default_factory=time.time)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+
+# Streaming sessions by session_id, least recently used first
+stream_sessions: "OrderedDict[str, StreamSession]" = OrderedDict()
+
+
+def get_stream_session(session_id: str) -> StreamSession:
+    """Return (or create) a session, evicting idle and least recently used ones"""
+    now = time.time()
+
+    for sid in [sid for sid, s in stream_sessions.items() if now - s.last_seen > STREAM_SESSION_TTL]:
+        del stream_sessions[sid]
+
+    session = stream_sessions.pop(session_id, None) or StreamSession()
+    session.last_seen = now
+    stream_sessions[session_id] = session
+
+    while len(stream_sessions) > MAX_STREAM_SESSIONS:
+        stream_sessions.popitem(last=False)
+
+    return session
+
+
+def drop_overlap(previous: List[int], current: List[int], max_overlap: int = 32) -> List[int]:
+    """Remove tokens at the start of current that repeat the end of previous (the overlap audio)"""
+    for k in range(min(len(previous), len(current), max_overlap), 0, -1):
+        if previous[-k:] == current[:k]:
+            return current[k:]
+    return current
+
+
+def release_memory():
+    """Collect garbage and return unused cached CUDA memory to the driver"""
+    gc.collect()
+    if device == "cuda":
+        torch.cuda.empty_cache()
+
+
+def configure_cuda_memory():
+    """
+    Cap this process's share of GPU memory and, in debug mode, record
+    allocator history for leak hunting
+
+    The snapshot is written to whisper_memory.pickle on shutdown and can be
+    inspected at https://pytorch.org/memory_viz
+    """
+    if device != "cuda":
+        return
+
+    if CUDA_MEMORY_FRACTION > 0:
+        torch.cuda.set_per_process_memory_fraction(CUDA_MEMORY_FRACTION)
+        print(f"Capping CUDA memory at {CUDA_MEMORY_FRACTION:.0%} of device")
+
+    if LOG_LEVEL == "debug":
+        torch.cuda.memory._record_memory_history()
+
+
+def to_fp16(m):
+    """Cast weights to FP16 on GPU (LayerNorm stays FP32, Whisper normalizes in float)"""
+    if device != "cuda":
+        return m
+
+    m = m.half()
+    for module in m.modules():
+        if isinstance(module, whisper.model.LayerNorm):
+            module.float()
+
+    return m
+
+
+def model_cache_path() -> Path:
+    """Cache file for the current model size and precision"""
+    precision = "fp16" if device == "cuda" else "fp32"
+    return MODEL_CACHE_DIR / f"whisper_{WHISPER_MODEL}_{precision}.pt"
+
+
+def load_cached_model():
+    """
+    Load the converted model from MODEL_CACHE_DIR, or return None on a miss
+
+    The checkpoint is memory-mapped and its tensors are assigned directly
+    to the module, so there is no download, no FP32 copy and no re-cast.
+    """
+    path = model_cache_path()
+    if not path.exists():
+        return None
+
+    try:
+        # torch < 2.3 only accepts a str filename together with mmap
+        checkpoint = torch.load(str(path), map_location=device, mmap=True, weights_only=True)
+        m = build_empty_model(whisper.model.ModelDimensions(**checkpoint["dims"]))
+        m.load_state_dict(checkpoint["model_state_dict"], assign=True)
+        restore_buffers(m)
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable model cache {path}: {e}")
+        return None
+
+    if WHISPER_MODEL in whisper._ALIGNMENT_HEADS:
+        m.set_alignment_heads(whisper._ALIGNMENT_HEADS[WHISPER_MODEL])
+
+    print(f"Loaded cached model from {path}")
+    return m.to(device)
+
+
+def build_empty_model(dims):
+    """
+    Whisper with its encoder and decoder parameters on the meta device
+
+    Mirrors Whisper.__init__, except the submodules are built under
+    torch.device("meta") so no FP32 weights are allocated or initialised.
+    Whisper.__init__ itself can't run on meta: the alignment heads go
+    through to_sparse(), which has no meta kernel. Those and the decoder
+    mask are set by restore_buffers once the weights are assigned.
+    """
+    m = whisper.model.Whisper.__new__(whisper.model.Whisper)
+    torch.nn.Module.__init__(m)
+    m.dims = dims
+
+    with torch.device("meta"):
+        m.encoder = whisper.model.AudioEncoder(
+            dims.n_mels, dims.n_audio_ctx, dims.n_audio_state, dims.n_audio_head, dims.n_audio_layer
+        )
+        m.decoder = whisper.model.TextDecoder(
+            dims.n_vocab, dims.n_text_ctx, dims.n_text_state, dims.n_text_head, dims.n_text_layer
+        )
+
+    return m
+
+
+def restore_buffers(m):
+    """Rebuild the non-persistent buffers a checkpoint does not store"""
+    n_ctx, n_layer, n_head = m.dims.n_text_ctx, m.dims.n_text_layer, m.dims.n_text_head
+    # Same dtype the converted model's mask had (half() casts buffers too)
+    dtype = m.decoder.token_embedding.weight.dtype
+    m.decoder.register_buffer(
+        "mask", torch.empty(n_ctx, n_ctx, dtype=dtype).fill_(-np.inf).triu_(1), persistent=False
+    )
+
+    # Default alignment heads (last half of the decoder layers), as in Whisper.__init__
+    heads = torch.zeros(n_layer, n_head, dtype=torch.bool)
+    heads[n_layer // 2:] = True
+    m.register_buffer("alignment_heads", heads.to_sparse(), persistent=False)
+
+
+def save_model_cache(m):
+    """Write the converted (pre-compile) state_dict in whisper's checkpoint layout"""
+    path = model_cache_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        torch.save({"dims": asdict(m.dims), "model_state_dict": m.state_dict()}, path)
+        print(f"Cached model at {path}")
+        return True
+    except OSError as e:
+        print(f"⚠️ Could not write model cache {path}: {e}")
+        return False
+
+
+def verify_model_cache(m):
+    """
+    Load the cache that was just written and check it reproduces the model
+
+    Runs once, on the boot that wrote the cache. A cache that fails to load
+    or whose logits differ is deleted, so later boots download again rather
+    than serve a broken model.
+    """
+    cached = load_cached_model()
+    matches = False
+
+    if cached is not None:
+        tokenizer = whisper.tokenizer.get_tokenizer(m.is_multilingual, num_languages=m.num_languages)
+        mel = torch.zeros(
+            1, m.dims.n_mels, whisper.audio.N_FRAMES,
+            device=m.device, dtype=m.encoder.conv1.weight.dtype,
+        )
+        tokens = torch.tensor([list(tokenizer.sot_sequence)], device=m.device)
+
+        with torch.inference_mode():
+            expected = m.logits(tokens, m.embed_audio(mel))
+            actual = cached.logits(tokens, cached.embed_audio(mel))
+        matches = torch.allclose(expected.float(), actual.float(), atol=1e-3)
+        del cached
+
+    if not matches:
+        print(f"⚠️ Model cache {model_cache_path()} does not reproduce the model, removing it")
+        model_cache_path().unlink(missing_ok=True)
+
+    release_memory()
+
+
+def optimize_model(m):
+    """
+    Apply GPU inference optimizations to a loaded Whisper model
+
+    - PyTorch SDPA (flash / memory-efficient attention kernels)
+    - torch.compile of the encoder when USE_COMPILE=true, with the FX graph
+      cache on so restarts reuse compiled kernels
+    """
+    if device != "cuda":
+        return m
+
+    whisper.model.MultiHeadAttention.use_sdpa = True
+    torch.backends.cuda.enable_flash_sdp(True)
+    torch.backends.cuda.enable_mem_efficient_sdp(True)
+
+    if USE_COMPILE:
+        import torch._inductor.config
+        torch._inductor.config.fx_graph_cache = True
+
+        # The encoder always sees fixed 30s windows, so CUDA graphs pay off.
+        # The decoder stays eager: its shapes grow every step, and with
+        # dynamic=True whisper's is_causal flag becomes a SymBool that SDPA
+        # rejects, while static shapes would recompile per token count.
+        m.encoder = torch.compile(m.encoder, mode="reduce-overhead", fullgraph=False)
+
+    return m
+
+
+def warm_up(m):
+    """
+    Decode silent 30s windows at every batch size the scheduler can send
+
+    The encoder's CUDA graphs are recorded per input shape, so each batch
+    size from 1 to MAX_BATCH_SIZE is compiled here rather than on the model
+    thread while real requests wait.
+    """
+    options = whisper.DecodingOptions(language="en", fp16=device == "cuda")
+    for size in range(1, MAX_BATCH_SIZE + 1):
+        mel = torch.zeros(size, m.dims.n_mels, whisper.audio.N_FRAMES, device=m.device)
+        whisper.decode(m, mel, options)
+
+
 @app.on_event("startup")
 async def load_model():
     """Load Whisper model on startup"""
     global model
     print(f"Loading Whisper model: {WHISPER_MODEL} on device: {device}")
     
+    configure_cuda_memory()
+
     try:
-        model = whisper.load_model(WHISPER_MODEL, device=device)
+        m = load_cached_model()
+        if m is None:
+            m = to_fp16(whisper.load_model(WHISPER_MODEL, device=device))
+            if save_model_cache(m):
+                verify_model_cache(m)
+        model = optimize_model(m)
+        
+        if USE_COMPILE and device == "cuda":
+            print(f"Compiling model (warm-up decodes, batch sizes 1-{MAX_BATCH_SIZE})...")
+            await asyncio.get_running_loop().run_in_executor(
+                scheduler.executor, warm_up, model
+            )
+        
         model_loaded.set(1)
         print(f"✅ Model loaded successfully")
     except Exception as e:
@@ -74,6 +641,19 @@ async def load_model():
         model_loaded.set(0)
         raise
 
+    scheduler.start()
+    print(f"Batching up to {MAX_BATCH_SIZE} requests every {MAX_BATCH_WAIT_MS}ms")
+
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    """Stop the batch worker"""
+    await scheduler.stop()
+    scheduler.executor.shutdown(wait=False)
+
+    if device == "cuda" and LOG_LEVEL == "debug":
+        torch.cuda.memory._dump_snapshot("whisper_memory.pickle")
+
 
 @app.get("/")
 async def root():
@@ -108,101 +688,141 @@ async def metrics():
     return generate_latest(registry)
 
 
-@app.post("/transcribe")
-async def transcribe(
-    audio: UploadFile = File(...),
-    language: Optional[str] = Form(None),
-    temperature: Optional[float] = Form(0.0),
-    prompt: Optional[str] = Form(None),
-):
+def reject_too_large():
+    """Count and raise the 413 for an oversized upload"""
+    errors_total.labels(error_type="file_too_large").inc()
+    raise HTTPException(
+        status_code=413,
+        detail=f"File too large. Max size: {MAX_FILE_SIZE / 1024 / 1024}MB",
+    )
+
+
+async def read_upload(audio: UploadFile) -> bytearray:
     """
-    Transcribe audio file to text
+    Read an upload in UPLOAD_CHUNK_SIZE pieces with a running size check
+
+    Oversized files are rejected from the declared size when the client
+    sent one, otherwise as soon as the running total passes MAX_FILE_SIZE,
+    without buffering the whole file first.
+    """
+    if audio.size is not None and audio.size > MAX_FILE_SIZE:
+        reject_too_large()
     
-    Args:
-        audio: Audio file (m4a, mp3, wav, webm, ogg)
-        language: ISO 639-1 language code (optional, auto-detect if not provided)
-        temperature: Sampling temperature 0.0-1.0 (optional, default 0.0)
-        prompt: Context hint for better accuracy (optional)
+    content = bytearray()
+    while chunk := await audio.read(UPLOAD_CHUNK_SIZE):
+        content += chunk
+        if len(content) > MAX_FILE_SIZE:
+            reject_too_large()
     
-    Returns:
-        {
-            "transcript": "transcribed text",
-            "language": "en",
-            "duration": 5.2,
-            "segments": [...]
-        }
+    return content
+
+
+def record_transcription(duration: float):
+    """Update success metrics for one transcription"""
+    transcriptions_total.inc()
+    transcription_duration.observe(duration)
+
+
+async def _do_transcribe(
+    content: Union[bytes, bytearray],
+    filename: Optional[str],
+    language: Optional[str] = None,
+    temperature: Optional[float] = 0.0,
+    prompt: Optional[str] = None,
+    background: Optional[BackgroundTasks] = None,
+) -> dict:
+    """
+    Validate, transcribe and record metrics for one uploaded file
+
+    Shared by the single-file and batch endpoints. Concurrent calls land in
+    the same scheduler window and are decoded together. With background
+    tasks, metric updates run after the response has been sent.
     """
     if not model:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
     # Check file size
-    file_size = 0
-    chunk = await audio.read(MAX_FILE_SIZE + 1)
-    file_size = len(chunk)
+    file_size = len(content)
     
     if file_size > MAX_FILE_SIZE:
-        errors_total.labels(error_type="file_too_large").inc()
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Max size: {MAX_FILE_SIZE / 1024 / 1024}MB",
-        )
+        reject_too_large()
     
-    # Save to temp file
-    temp_path = None
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".audio") as temp_file:
-            temp_file.write(chunk)
-            temp_path = temp_file.name
-        
-        print(f"Transcribing audio: {audio.filename} ({file_size / 1024:.1f}KB)")
+        print(f"Transcribing audio: {filename} ({file_size / 1024:.1f}KB)")
         
         # Transcribe
         start = time.time()
         
-        result = model.transcribe(
-            temp_path,
-            language=language,
-            temperature=temperature,
-            initial_prompt=prompt,
-            verbose=False,
-        )
+        result = await scheduler.submit(content, language, temperature, prompt)
         
         duration = time.time() - start
         
-        # Update metrics
-        transcriptions_total.inc()
-        transcription_duration.observe(duration)
+        # Update metrics (off the critical path when possible)
+        if background is not None:
+            background.add_task(record_transcription, duration)
+        else:
+            record_transcription(duration)
         
         print(
             f"✅ Transcription complete in {duration:.2f}s "
             f"(language: {result.get('language', 'unknown')})"
         )
         
-        return JSONResponse(
-            content={
-                "transcript": result["text"],
-                "language": result.get("language"),
-                "duration": result.get("duration"),
-                "segments": result.get("segments", []),
-            }
-        )
+        return {
+            "transcript": result["text"],
+            "language": result.get("language"),
+            "duration": result.get("duration"),
+            "segments": result.get("segments", []),
+        }
     
     except Exception as e:
         errors_total.labels(error_type="transcription_error").inc()
         print(f"❌ Transcription error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/transcribe")
+async def transcribe(
+    background: BackgroundTasks,
+    audio: UploadFile = File(...),
+    language: Optional[str] = Form(None),
+    temperature: Optional[float] = Form(0.0),
+    prompt: Optional[str] = Form(None),
+):
+    """
+    Transcribe audio file to text
+    
+    Args:
+        audio: Audio file (m4a, mp3, wav, webm, ogg)
+        language: ISO 639-1 language code (optional, auto-detect if not provided)
+        temperature: Sampling temperature 0.0-1.0 (optional, default 0.0)
+        prompt: Context hint for better accuracy (optional)
     
-    finally:
-        # Clean up temp file
-        if temp_path and os.path.exists(temp_path):
-            os.unlink(temp_path)
+    Returns:
+        {
+            "transcript": "transcribed text",
+            "language": "en",
+            "duration": 5.2,
+            "segments": [...]
+        }
+    """
+    content = await read_upload(audio)
+    result = await _do_transcribe(
+        content, audio.filename, language, temperature, prompt, background
+    )
+    return JSONResponse(content=result)
 
 
 @app.post("/transcribe/batch")
-async def transcribe_batch(files: list[UploadFile] = File(...)):
+async def transcribe_batch(
+    background: BackgroundTasks,
+    files: list[UploadFile] = File(...),
+):
     """
     Batch transcribe multiple audio files
     
+    Files are submitted concurrently so they share scheduler batches
+    
     Returns:
         {
             "results": [
@@ -211,33 +831,142 @@ async def transcribe_batch(files: list[UploadFile] = File(...)):
             ]
         }
     """
+    async def read_and_transcribe(audio: UploadFile) -> dict:
+        content = await read_upload(audio)
+        return await _do_transcribe(content, audio.filename, background=background)
+    
+    outcomes = await asyncio.gather(
+        *[read_and_transcribe(audio) for audio in files],
+        return_exceptions=True,
+    )
+    
     results = []
     
-    for audio in files:
-        try:
-            result = await transcribe(audio)
+    for audio, outcome in zip(files, outcomes):
+        if isinstance(outcome, Exception):
+            error = outcome.detail if isinstance(outcome, HTTPException) else str(outcome)
             results.append({
                 "filename": audio.filename,
-                "transcript": result["transcript"],
-                "language": result.get("language"),
-                "status": "success",
+                "error": error,
+                "status": "error",
             })
-        except Exception as e:
+        else:
             results.append({
                 "filename": audio.filename,
-                "error": str(e),
-                "status": "error",
+                "transcript": outcome["transcript"],
+                "language": outcome.get("language"),
+                "status": "success",
             })
     
     return {"results": results}
 
 
+@app.post("/transcribe/stream")
+async def transcribe_stream(
+    background: BackgroundTasks,
+    audio: UploadFile = File(...),
+    session_id: str = Form(...),
+    language: Optional[str] = Form(None),
+    final: bool = Form(False),
+):
+    """
+    Transcribe one chunk of a streamed utterance
+    
+    Each session keeps the tail of the previous chunk's audio (STREAM_OVERLAP_MS),
+    which is prepended to the new chunk so words cut at the boundary are
+    decoded whole, and the previously decoded tokens, which are fed back as
+    decoder context. Tokens repeated from the overlap are dropped. Chunks
+    must be at most 30s.
+    
+    Args:
+        audio: Audio chunk (m4a, mp3, wav, webm, ogg)
+        session_id: Client-chosen id shared by all chunks of one utterance
+        language: ISO 639-1 language code (optional, detected on first chunk)
+        final: Close the session after this chunk
+    
+    Returns:
+        {
+            "session_id": "abc",
+            "transcript": "text of this chunk",
+            "full_transcript": "text of the session so far",
+            "language": "en"
+        }
+    """
+    if not model:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    content = await read_upload(audio)
+    
+    session = get_stream_session(session_id)
+    
+    async with session.lock:
+        try:
+            chunk = await asyncio.to_thread(decode_audio, content)
+        except Exception as e:
+            errors_total.labels(error_type="transcription_error").inc()
+            raise HTTPException(status_code=400, detail=f"Could not decode audio: {e}")
+        
+        if chunk.shape[0] > whisper.audio.N_SAMPLES:
+            raise HTTPException(status_code=413, detail="Stream chunks must be at most 30s")
+        
+        # Overlap with the previous chunk, trimmed to fit one 30s window
+        samples = np.concatenate([session.tail, chunk])[-whisper.audio.N_SAMPLES:]
+        
+        start = time.time()
+        try:
+            result = await scheduler.submit(
+                None,
+                language or session.language,
+                0.0,
+                session.tokens or None,
+                audio=samples,
+            )
+        except Exception as e:
+            errors_total.labels(error_type="transcription_error").inc()
+            print(f"❌ Stream transcription error: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        
+        background.add_task(record_transcription, time.time() - start)
+        
+        tokenizer = whisper.tokenizer.get_tokenizer(
+            model.is_multilingual, num_languages=model.num_languages
+        )
+        tokens = [
+            t for segment in result["segments"] for t in segment["tokens"]
+            if t < tokenizer.eot
+        ]
+        tokens = drop_overlap(session.tokens, tokens)
+        text = tokenizer.decode(tokens).strip()
+        
+        overlap = whisper.audio.SAMPLE_RATE * STREAM_OVERLAP_MS // 1000
+        session.tail = chunk[-overlap:] if overlap else chunk[:0]
+        session.tokens = (session.tokens + tokens)[-(model.dims.n_text_ctx // 2 - 1):]
+        session.language = session.language or result.get("language")
+        if text:
+            session.text.append(text)
+        
+        response = {
+            "session_id": session_id,
+            "transcript": text,
+            "full_transcript": " ".join(session.text),
+            "language": session.language,
+        }
+    
+    if final:
+        stream_sessions.pop(session_id, None)
+    
+    return response
+
+
 if __name__ == "__main__":
     import uvicorn
     
+    # Each worker process loads its own model; run the host under CUDA MPS
+    # so their kernels share SMs instead of time-slicing the GPU
     uvicorn.run(
-        app,
+        "server:app",
         host="0.0.0.0",
         port=8000,
+        workers=MAX_WORKERS,
         log_level=LOG_LEVEL,
     )
@@ -8,6 +8,7 @@ parameters for TTS and avatar animation.
 
 import torch
 import numpy as np
+from scipy.special import softmax as _softmax
 
 EMOTION_LABELS = ["calm", "guarded", "lit"]
 
@@ -21,8 +22,33 @@ def softmax(x):
     Returns:
         Normalized probability distribution
     """
-    e_x = np.exp(x - np.max(x))
-    return e_x / e_x.sum(axis=0)
+    return _softmax(np.asarray(x, dtype=np.float64), axis=0)
+
+def to_vector(blend):
+    """
+    Convert a blend to the canonical fixed-order vector.
+    
+    Args:
+        blend: Dictionary keyed by emotion label, or array-like in EMOTION_LABELS order
+        
+    Returns:
+        np.ndarray of shape (3,) ordered [calm, guarded, lit]
+    """
+    if isinstance(blend, dict):
+        return np.array([blend[key] for key in EMOTION_LABELS], dtype=np.float64)
+    return np.asarray(blend, dtype=np.float64)
+
+def to_dict(vector):
+    """
+    Convert a blend vector to a label-keyed dictionary (API boundary only).
+    
+    Args:
+        vector: Array in EMOTION_LABELS order
+        
+    Returns:
+        Dictionary mapping emotion labels to Python floats
+    """
+    return dict(zip(EMOTION_LABELS, vector.tolist()))
 
 def blend_emotions(logits, alpha=0.7):
     """
@@ -33,23 +59,21 @@ def blend_emotions(logits, alpha=0.7):
         alpha: Temperature smoothing factor (higher = sharper confidence)
         
     Returns:
-        Dictionary mapping emotion labels to probabilities
+        Probability vector ordered [calm, guarded, lit]
     """
-    probs = softmax(np.array(logits) / alpha)
-    probs = np.clip(probs, 0, 1)
-    return dict(zip(EMOTION_LABELS, probs))
+    return _softmax(np.asarray(logits, dtype=np.float64) / alpha, axis=0)
 
 def compute_modulation(blend):
     """
     Interpolates modulation parameters for voice + avatar animation.
     
     Args:
-        blend: Dictionary with emotion probabilities {calm, guarded, lit}
+        blend: Emotion vector ordered [calm, guarded, lit]
         
     Returns:
         Dictionary with TTS and visual modulation parameters
     """
-    calm, guarded, lit = blend["calm"], blend["guarded"], blend["lit"]
+    calm, guarded, lit = to_vector(blend).tolist()
 
     # TTS parameters
     tts_pitch_shift = round((lit - calm) * 0.08, 3)
@@ -77,35 +101,35 @@ def smooth_blend(prev_blend, new_blend, smoothing=0.3):
     Temporal smoothing between emotion vectors to avoid jitter.
     
     Args:
-        prev_blend: Previous emotion blend dictionary
-        new_blend: New emotion blend dictionary
+        prev_blend: Previous emotion vector
+        new_blend: New emotion vector
         smoothing: Smoothing factor (0 = all new, 1 = all previous)
         
     Returns:
-        Smoothed emotion blend dictionary
+        Smoothed emotion vector
     """
-    smoothed = {}
-    for key in EMOTION_LABELS:
-        smoothed[key] = round(
-            (1 - smoothing) * new_blend[key] + smoothing * prev_blend[key],
-            3
-        )
-    return smoothed
+    return np.round((1 - smoothing) * to_vector(new_blend) + smoothing * to_vector(prev_blend), 3)
 
 def process_emotion_logits(logits, prev_blend=None):
     """
     End-to-end blending pipeline: logits → continuous blend → smoothed output.
     
+    EmotionClassifier already ends in a softmax, so its outputs are
+    probabilities and must not be passed here (that would normalize twice).
+    Use this for raw, unnormalized scores only.
+    
     Args:
-        logits: Raw model logits (array-like)
-        prev_blend: Optional previous blend for temporal smoothing
+        logits: Raw unnormalized model logits (array-like)
+        prev_blend: Optional previous blend (dictionary or vector) for temporal
+            smoothing; None or an empty blend means there is no previous blend
         
     Returns:
         Dictionary with blend_vector and modulation parameters
     """
     new_blend = blend_emotions(logits)
     final_blend = (
-        smooth_blend(prev_blend, new_blend) if prev_blend else new_blend
+        smooth_blend(prev_blend, new_blend)
+        if prev_blend is not None and len(prev_blend) else new_blend
     )
     modulation = compute_modulation(final_blend)
-    return {"blend_vector": final_blend, "modulation": modulation}
+    return {"blend_vector": to_dict(final_blend), "modulation": modulation}
@@ -9,52 +9,343 @@ Multimodal emotion classification using:
 Supports both discrete and blended emotion outputs
 """
 
+import asyncio
+import os
+import re
 import torch
 import torchaudio
 from transformers import Wav2Vec2Processor, Wav2Vec2Model, AutoTokenizer, AutoModel
 import numpy as np
-import tempfile
-import os
-from typing import Dict, Any
+import io
+import threading
+from typing import Dict, Any, Optional, Tuple
 from app.emotion_blend import process_emotion_logits
+from app.model import EmotionClassifier, export_onnx, quantize_classifier
+from app.utils.audio_processing import resample_audio
+from app.utils.feature_fusion import concatenate_features
+
+try:
+    import onnxruntime as ort
+except ImportError:  # Optional: fall back to PyTorch eager
+    ort = None
 
 # Model configuration
 AUDIO_MODEL = "facebook/wav2vec2-base"
 TEXT_MODEL = "sentence-transformers/all-mpnet-base-v2"
-CLASSIFIER_PATH = "./checkpoints/emotion_mapper.pt"
+CLASSIFIER_PATH = os.getenv("CLASSIFIER_PATH", "./checkpoints/emotion_mapper.pt")
+CLASSIFIER_ONNX_PATH = os.path.splitext(CLASSIFIER_PATH)[0] + ".onnx"
+CLASSIFIER_INT8_PATH = os.path.splitext(CLASSIFIER_PATH)[0] + ".int8.onnx"
+# Recorded fused features (N, 1536) .npy used to validate the int8 classifier
+CLASSIFIER_CALIBRATION_PATH = os.getenv(
+    "CLASSIFIER_CALIBRATION_PATH", os.path.splitext(CLASSIFIER_PATH)[0] + "_calibration.npy"
+)
+QUANTIZE_CLASSIFIER = os.getenv("QUANTIZE_CLASSIFIER", "true").lower() == "true"
+SAMPLE_RATE = 16000
+PINNED_BUFFER_SAMPLES = 30 * SAMPLE_RATE  # initial staging size, grows for longer clips
+
+device = "cuda" if torch.cuda.is_available() else "cpu"
 
 # Emotion categories
 EMOTIONS = ["calm", "guarded", "lit"]
 
-# Lazy load models
+# Lexical indicators (from existing emotion classifier): emotion -> (phrases, weight)
+LEXICAL_INDICATORS = {
+    "calm": (["yeah", "actually", "clear", "peaceful", "fine", "okay", "calm", "steady"], 0.1),
+    "guarded": (["i mean", "i guess", "maybe", "kind of", "tired", "worried", "uncertain"], 0.1),
+    "lit": (["let's do it", "amazing", "excited", "can't wait", "love", "yes", "ready"], 0.15),
+}
+
+# Phrase -> (emotion index, weight), plus one precompiled pattern matching every phrase.
+# The lookahead finds overlapping hits so results match per-phrase substring checks.
+_INDICATOR_WEIGHTS = {
+    phrase: (EMOTIONS.index(emotion), weight)
+    for emotion, (phrases, weight) in LEXICAL_INDICATORS.items()
+    for phrase in phrases
+}
+_INDICATOR_PATTERN = re.compile(
+    "(?=(" + "|".join(re.escape(p) for p in sorted(_INDICATOR_WEIGHTS, key=len, reverse=True)) + "))"
+)
+
+# Models (loaded once at startup)
 audio_processor = None
 audio_encoder = None
 text_tokenizer = None
 text_encoder = None
 classifier = None
 
+# Per-thread pinned host staging buffers for async host -> device copies,
+# plus the reusable fused feature buffer
+_staging = threading.local()
+
+# Glow colors (RGB) and the resolution of the precomputed color lookup table
+GLOW_AMBER = np.array([245, 158, 66])   # Calm
+GLOW_BLUE = np.array([74, 144, 226])    # Guarded
+GLOW_GREEN = np.array([126, 211, 33])   # Lit
+COLOR_LUT_BINS = 16
+
 def load_models():
-    """Lazy load ML models"""
+    """Load ML models (called from the FastAPI startup event)"""
     global audio_processor, audio_encoder, text_tokenizer, text_encoder, classifier
     
     if audio_processor is None:
         print("Loading Wav2Vec2 audio encoder...")
         audio_processor = Wav2Vec2Processor.from_pretrained(AUDIO_MODEL)
-        audio_encoder = Wav2Vec2Model.from_pretrained(AUDIO_MODEL)
+        audio_encoder = Wav2Vec2Model.from_pretrained(AUDIO_MODEL).to(device)
         audio_encoder.eval()
     
     if text_tokenizer is None:
         print("Loading sentence transformer text encoder...")
         text_tokenizer = AutoTokenizer.from_pretrained(TEXT_MODEL)
-        text_encoder = AutoModel.from_pretrained(TEXT_MODEL)
+        text_encoder = AutoModel.from_pretrained(TEXT_MODEL).to(device)
         text_encoder.eval()
     
-    if classifier is None:
+    if classifier is None and os.path.exists(CLASSIFIER_PATH):
         print("Loading emotion classifier...")
-        # For now, use a placeholder - replace with actual trained model
-        # classifier = torch.jit.load(CLASSIFIER_PATH)
-        # Fallback to simple rule-based classifier
-        pass
+        classifier = _load_classifier()
+    elif classifier is None:
+        # No trained checkpoint yet: fall back to simple rule-based classifier
+        print("No emotion classifier checkpoint, using rule-based classification")
+
+def _load_classifier():
+    """
+    Load the trained fusion classifier
+    
+    Exports the checkpoint to ONNX (re-exported when the checkpoint is newer)
+    and serves it through ONNX Runtime with extended graph optimizations. On CPU
+    the exported graph is int8-quantized first when calibration features are
+    available to validate it against FP32. The optimized graph is
+    cached next to the checkpoint so later startups skip the optimization
+    passes. Falls back to PyTorch eager without onnxruntime or when the
+    export, quantization or session creation fails (e.g. a read-only
+    checkpoint directory), using dynamic int8 quantization on CPU under the
+    same validation.
+    """
+    model = EmotionClassifier()
+    model.load_state_dict(torch.load(CLASSIFIER_PATH, map_location="cpu"))
+    model.eval()
+    
+    # int8 is only served once it has been validated against FP32
+    calibration = _load_calibration() if device == "cpu" and QUANTIZE_CLASSIFIER else None
+    
+    if ort is not None:
+        try:
+            return _load_ort_session(model, calibration)
+        except Exception as e:
+            # e.g. a read-only checkpoint directory or a failed export
+            print(f"Warning: ONNX Runtime classifier unavailable, serving PyTorch instead: {e}")
+    
+    if calibration is not None:
+        return quantize_classifier(model, (torch.from_numpy(calibration),))
+    return model.to(device)
+
+def _load_ort_session(model: EmotionClassifier, calibration: Optional[np.ndarray]):
+    """Export (and optionally quantize) the classifier, then open an ONNX Runtime session"""
+    checkpoint_mtime = os.path.getmtime(CLASSIFIER_PATH)
+    if not os.path.exists(CLASSIFIER_ONNX_PATH) or os.path.getmtime(CLASSIFIER_ONNX_PATH) < checkpoint_mtime:
+        print("Exporting emotion classifier to ONNX...")
+        export_onnx(model, CLASSIFIER_ONNX_PATH)
+    
+    model_path = _quantize_onnx(calibration) if calibration is not None else CLASSIFIER_ONNX_PATH
+    
+    sess_options = ort.SessionOptions()
+    cache_path = os.path.splitext(model_path)[0] + ".ort.onnx"
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(model_path):
+        # Already optimized, don't run the passes again
+        model_path = cache_path
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    else:
+        # Optimize once and cache the result for the next startup. ENABLE_ALL
+        # adds hardware specific layout changes, so the cached graph stops
+        # at EXTENDED and stays valid on other hosts sharing the checkpoint.
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+        sess_options.optimized_model_filepath = cache_path
+    
+    providers = [
+        p for p in ("CUDAExecutionProvider", "CPUExecutionProvider")
+        if p in ort.get_available_providers()
+    ]
+    return ort.InferenceSession(model_path, sess_options, providers=providers)
+
+def _load_calibration():
+    """Recorded fused features for validating quantization, or None if not provided"""
+    if not os.path.exists(CLASSIFIER_CALIBRATION_PATH):
+        print(f"No calibration features at {CLASSIFIER_CALIBRATION_PATH}, serving the FP32 classifier")
+        return None
+    return np.load(CLASSIFIER_CALIBRATION_PATH).astype(np.float32).reshape(-1, 1536)
+
+def _quantize_onnx(calibration: np.ndarray, min_correlation: float = 0.99) -> str:
+    """
+    Dynamic int8 quantization of the exported ONNX classifier
+    
+    Returns the int8 model path, or the FP32 path if its outputs on the
+    calibration features correlate less than min_correlation with FP32.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    
+    if not os.path.exists(CLASSIFIER_INT8_PATH) or os.path.getmtime(CLASSIFIER_INT8_PATH) < os.path.getmtime(CLASSIFIER_ONNX_PATH):
+        print("Quantizing emotion classifier to int8...")
+        quantize_dynamic(CLASSIFIER_ONNX_PATH, CLASSIFIER_INT8_PATH, weight_type=QuantType.QInt8)
+    
+    outputs = [
+        ort.InferenceSession(path, providers=["CPUExecutionProvider"]).run(None, {"input": calibration})[0].ravel()
+        for path in (CLASSIFIER_ONNX_PATH, CLASSIFIER_INT8_PATH)
+    ]
+    correlation = np.corrcoef(outputs)[0, 1]
+    if correlation < min_correlation:
+        print(f"Quantized classifier correlation {correlation:.4f} < {min_correlation}, keeping FP32")
+        return CLASSIFIER_ONNX_PATH
+    
+    return CLASSIFIER_INT8_PATH
+
+def _to_device(tensor: torch.Tensor) -> torch.Tensor:
+    """
+    Copy a float32 CPU tensor to the GPU through a reusable pinned staging buffer
+    
+    The copy is issued with non_blocking=True, so it overlaps with kernels
+    still running for the previous request. The buffer is only rewritten
+    once its previous copy has completed.
+    """
+    flat = tensor.reshape(-1)
+    buffer = getattr(_staging, "buffer", None)
+    
+    if buffer is None or buffer.numel() < flat.numel():
+        buffer = torch.empty(max(flat.numel(), PINNED_BUFFER_SAMPLES), dtype=torch.float32).pin_memory()
+        _staging.buffer = buffer
+        _staging.copied = None
+    elif _staging.copied is not None:
+        _staging.copied.synchronize()
+    
+    staging = buffer[:flat.numel()]
+    staging.copy_(flat)
+    on_device = staging.to(device, non_blocking=True).view(tensor.shape)
+    
+    _staging.copied = torch.cuda.Event()
+    _staging.copied.record()
+    return on_device
+
+def _mean_pool(encoder, inputs) -> torch.Tensor:
+    """Run an encoder and mean-pool its last hidden state"""
+    return encoder(**inputs).last_hidden_state.mean(dim=1)
+
+def _encode_concurrently(inputs, tokens) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Run the audio and text encoders on separate CUDA streams so their kernels overlap
+    
+    Returns:
+        (audio_feat, text_feat) ready to use on the current stream
+    """
+    current = torch.cuda.current_stream()
+    audio_stream = torch.cuda.Stream()
+    text_stream = torch.cuda.Stream()
+    
+    # Inputs were copied on the current stream
+    audio_stream.wait_stream(current)
+    text_stream.wait_stream(current)
+    
+    with torch.cuda.stream(audio_stream):
+        audio_feat = _mean_pool(audio_encoder, inputs)
+    with torch.cuda.stream(text_stream):
+        text_feat = _mean_pool(text_encoder, tokens)
+    
+    current.wait_stream(audio_stream)
+    current.wait_stream(text_stream)
+    
+    # Outputs were allocated on the side streams but are consumed on the current one
+    audio_feat.record_stream(current)
+    text_feat.record_stream(current)
+    
+    return audio_feat, text_feat
+
+def _classify(fused: torch.Tensor) -> np.ndarray:
+    """
+    Run the fusion classifier on (1, 1536) features and return [calm, guarded, lit]
+    
+    Features stay on the device through the classifier; only the final
+    3-vector is copied to the host, once.
+    """
+    if ort is not None and isinstance(classifier, ort.InferenceSession):
+        if fused.is_cuda and "CUDAExecutionProvider" in classifier.get_providers():
+            probs = _run_ort_on_device(fused)
+        else:
+            probs = classifier.run(None, {"input": fused.cpu().numpy()})[0][0]
+    else:
+        with torch.inference_mode():
+            probs = classifier(fused)[0].cpu().numpy()
+    
+    # Softmax head: already a distribution
+    return probs.astype(np.float64)
+
+def _run_ort_on_device(fused: torch.Tensor) -> np.ndarray:
+    """Bind the CUDA feature tensor directly as the ONNX Runtime input (no host round-trip)"""
+    fused = fused.contiguous().float()
+    # ONNX Runtime runs on its own stream; make sure the encoders have finished writing
+    torch.cuda.current_stream().synchronize()
+    
+    binding = classifier.io_binding()
+    binding.bind_input(
+        name="input",
+        device_type="cuda",
+        device_id=fused.device.index or 0,
+        element_type=np.float32,
+        shape=tuple(fused.shape),
+        buffer_ptr=fused.data_ptr(),
+    )
+    binding.bind_output("probs", "cpu")
+    classifier.run_with_iobinding(binding)
+    return binding.copy_outputs_to_cpu()[0][0]
+
+def _infer(content: bytes, transcript: str) -> np.ndarray:
+    """Full inference pipeline for one request, returns [calm, guarded, lit] probabilities"""
+    waveform, sr, fused = _extract_features(content, transcript)
+    
+    if classifier is not None:
+        return _classify(fused)
+    
+    # Placeholder until a trained classifier checkpoint is deployed
+    return _rule_based_classification(transcript, waveform, sr)
+
+def _extract_features(content: bytes, transcript: str) -> Tuple[torch.Tensor, int, torch.Tensor]:
+    """
+    Decode audio and run both encoders
+    
+    Returns:
+        (waveform at 16kHz, sample rate, fused features (1, 1536))
+    """
+    # Decode uploaded audio in memory
+    waveform, sr = torchaudio.load(io.BytesIO(content))
+    
+    # Resample if needed
+    if sr != SAMPLE_RATE:
+        waveform = resample_audio(waveform, sr, SAMPLE_RATE)
+        sr = SAMPLE_RATE
+    
+    # Process audio
+    inputs = audio_processor(waveform.squeeze().numpy(), sampling_rate=sr, return_tensors="pt")
+    if device == "cuda":
+        inputs = {
+            key: _to_device(value) if value.dtype == torch.float32 else value.to(device)
+            for key, value in inputs.items()
+        }
+    
+    # Tokenize text
+    tokens = text_tokenizer(transcript, return_tensors="pt", truncation=True, max_length=512).to(device)
+    
+    with torch.inference_mode():
+        if device == "cuda":
+            audio_feat, text_feat = _encode_concurrently(inputs, tokens)
+        else:
+            audio_feat = _mean_pool(audio_encoder, inputs)
+            text_feat = _mean_pool(text_encoder, tokens)
+    
+    # Fuse features into this thread's buffer; it is consumed by _classify
+    # before the thread handles another request
+    fused = getattr(_staging, "fused", None)
+    if fused is None or fused.device != audio_feat.device:
+        fused = torch.empty((1, audio_feat.shape[1] + text_feat.shape[1]), device=audio_feat.device)
+        _staging.fused = fused
+    fused = concatenate_features(audio_feat, text_feat, out=fused)
+    
+    return waveform, sr, fused
 
 async def predict_emotion(audio, transcript: str) -> Dict[str, Any]:
     """
@@ -72,62 +363,23 @@ async def predict_emotion(audio, transcript: str) -> Dict[str, Any]:
             }
         }
     """
-    load_models()
-    
-    # Save uploaded audio to temp file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-        content = await audio.read()
-        tmp.write(content)
-        tmp_path = tmp.name
-    
-    try:
-        # Extract audio features
-        waveform, sr = torchaudio.load(tmp_path)
-        
-        # Resample if needed
-        if sr != 16000:
-            resampler = torchaudio.transforms.Resample(sr, 16000)
-            waveform = resampler(waveform)
-            sr = 16000
-        
-        # Process audio
-        inputs = audio_processor(waveform.squeeze().numpy(), sampling_rate=sr, return_tensors="pt")
-        
-        with torch.no_grad():
-            audio_outputs = audio_encoder(**inputs)
-            audio_feat = audio_outputs.last_hidden_state.mean(dim=1)
-        
-        # Extract text features
-        tokens = text_tokenizer(transcript, return_tensors="pt", truncation=True, max_length=512)
-        
-        with torch.no_grad():
-            text_outputs = text_encoder(**tokens)
-            text_feat = text_outputs.last_hidden_state.mean(dim=1)
-        
-        # Fuse features
-        fused = torch.cat((audio_feat, text_feat), dim=1)
-        
-        # Classifier inference (placeholder - use rule-based for now)
-        # In production, load actual trained classifier
-        probs = _rule_based_classification(transcript, waveform, sr)
-        
-        emotion_idx = int(np.argmax(probs))
-        emotion = EMOTIONS[emotion_idx]
-        confidence = float(np.max(probs))
-        
-        # Generate modulation parameters
-        modulation = _generate_modulation(probs, emotion)
-        
-        return {
-            "emotion": emotion,
-            "confidence": confidence,
-            "modulation": modulation
-        }
+    content = await audio.read()
+    
+    # Decoding, encoding and classification are CPU/GPU bound; keep them off the event loop
+    probs = await asyncio.to_thread(_infer, content, transcript)
     
-    finally:
-        # Cleanup temp file
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+    emotion_idx = int(np.argmax(probs))
+    emotion = EMOTIONS[emotion_idx]
+    confidence = float(probs[emotion_idx])
+    
+    # Generate modulation parameters
+    modulation = _generate_modulation(probs, emotion)
+    
+    return {
+        "emotion": emotion,
+        "confidence": confidence,
+        "modulation": modulation
+    }
 
 async def predict_emotion_blended(audio, transcript: str) -> Dict[str, Any]:
     """
@@ -142,70 +394,32 @@ async def predict_emotion_blended(audio, transcript: str) -> Dict[str, Any]:
             "emotion_blend": str  # e.g., "guarded optimism"
         }
     """
-    load_models()
-    
-    # Save uploaded audio to temp file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-        content = await audio.read()
-        tmp.write(content)
-        tmp_path = tmp.name
-    
-    try:
-        # Extract audio features
-        waveform, sr = torchaudio.load(tmp_path)
-        
-        # Resample if needed
-        if sr != 16000:
-            resampler = torchaudio.transforms.Resample(sr, 16000)
-            waveform = resampler(waveform)
-            sr = 16000
-        
-        # Process audio
-        inputs = audio_processor(waveform.squeeze().numpy(), sampling_rate=sr, return_tensors="pt")
-        
-        with torch.no_grad():
-            audio_outputs = audio_encoder(**inputs)
-            audio_feat = audio_outputs.last_hidden_state.mean(dim=1)
-        
-        # Extract text features
-        tokens = text_tokenizer(transcript, return_tensors="pt", truncation=True, max_length=512)
-        
-        with torch.no_grad():
-            text_outputs = text_encoder(**tokens)
-            text_feat = text_outputs.last_hidden_state.mean(dim=1)
-        
-        # Fuse features
-        fused = torch.cat((audio_feat, text_feat), dim=1)
-        
-        # Get continuous emotion vector (placeholder - use rule-based for now)
-        emotion_vector = _rule_based_classification(transcript, waveform, sr)
-        
-        # Apply temporal smoothing (optional)
-        # emotion_vector = 0.7 * emotion_vector + 0.3 * previous_vector
-        
-        # Generate blended modulation
-        modulation = _generate_blended_modulation(emotion_vector)
-        
-        # Determine dominant emotion and blend description
-        dominant_idx = int(np.argmax(emotion_vector))
-        dominant_emotion = EMOTIONS[dominant_idx]
-        confidence = float(emotion_vector[dominant_idx])
-        
-        # Detect mixed states
-        emotion_blend = _detect_emotion_blend(emotion_vector)
-        
-        return {
-            "emotion_vector": emotion_vector.tolist(),
-            "dominant_emotion": dominant_emotion,
-            "confidence": confidence,
-            "emotion_blend": emotion_blend,
-            "modulation": modulation
-        }
+    content = await audio.read()
+    
+    # Decoding, encoding and classification are CPU/GPU bound; keep them off the event loop
+    emotion_vector = await asyncio.to_thread(_infer, content, transcript)
+    
+    # Apply temporal smoothing (optional)
+    # emotion_vector = 0.7 * emotion_vector + 0.3 * previous_vector
+    
+    # Generate blended modulation
+    modulation = _generate_blended_modulation(emotion_vector)
+    
+    # Determine dominant emotion and blend description
+    dominant_idx = int(np.argmax(emotion_vector))
+    dominant_emotion = EMOTIONS[dominant_idx]
+    confidence = float(emotion_vector[dominant_idx])
+    
+    # Detect mixed states
+    emotion_blend = _detect_emotion_blend(emotion_vector)
     
-    finally:
-        # Cleanup temp file
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+    return {
+        "emotion_vector": emotion_vector.tolist(),
+        "dominant_emotion": dominant_emotion,
+        "confidence": confidence,
+        "emotion_blend": emotion_blend,
+        "modulation": modulation
+    }
 
 def _rule_based_classification(transcript: str, waveform: torch.Tensor, sr: int) -> np.ndarray:
     """
@@ -215,42 +429,27 @@ def _rule_based_classification(transcript: str, waveform: torch.Tensor, sr: int)
     """
     transcript_lower = transcript.lower()
     
-    # Initialize scores
-    calm_score = 0.33
-    guarded_score = 0.33
-    lit_score = 0.33
-    
-    # Lexical indicators (from existing emotion classifier)
-    calm_indicators = ["yeah", "actually", "clear", "peaceful", "fine", "okay", "calm", "steady"]
-    guarded_indicators = ["i mean", "i guess", "maybe", "kind of", "tired", "worried", "uncertain"]
-    lit_indicators = ["let's do it", "amazing", "excited", "can't wait", "love", "yes", "ready"]
-    
-    for word in calm_indicators:
-        if word in transcript_lower:
-            calm_score += 0.1
-    
-    for word in guarded_indicators:
-        if word in transcript_lower:
-            guarded_score += 0.1
+    # Initialize scores [calm, guarded, lit]
+    scores = np.full(len(EMOTIONS), 0.33)
     
-    for word in lit_indicators:
-        if word in transcript_lower:
-            lit_score += 0.15
+    # Single scan over the transcript; each indicator counts once
+    for phrase in set(_INDICATOR_PATTERN.findall(transcript_lower)):
+        emotion_idx, weight = _INDICATOR_WEIGHTS[phrase]
+        scores[emotion_idx] += weight
     
     # Audio features (simple heuristics)
     # Calculate RMS energy
     energy = torch.sqrt(torch.mean(waveform ** 2)).item()
     
     if energy > 0.5:
-        lit_score += 0.2
+        scores[2] += 0.2
     elif energy < 0.2:
-        guarded_score += 0.15
+        scores[1] += 0.15
     else:
-        calm_score += 0.1
+        scores[0] += 0.1
     
     # Normalize to probabilities
-    total = calm_score + guarded_score + lit_score
-    probs = np.array([calm_score, guarded_score, lit_score]) / total
+    probs = scores / scores.sum()
     
     return probs
 
@@ -299,6 +498,24 @@ def _generate_blended_modulation(emotion_vector: np.ndarray) -> Dict[str, Any]:
         "glow_color": glow_color
     }
 
+def _build_color_lut() -> np.ndarray:
+    """Precompute hex glow colors for every quantized [calm, guarded, lit] bin"""
+    levels = np.arange(COLOR_LUT_BINS) / (COLOR_LUT_BINS - 1)
+    calm, guarded, lit = np.meshgrid(levels, levels, levels, indexing="ij")
+    
+    # Weighted blend
+    blended_rgb = calm[..., None] * GLOW_AMBER + guarded[..., None] * GLOW_BLUE + lit[..., None] * GLOW_GREEN
+    blended_rgb = np.clip(blended_rgb, 0, 255).astype(int)
+    
+    # Convert to hex
+    lut = np.empty(calm.shape, dtype="<U7")
+    for idx in np.ndindex(calm.shape):
+        r, g, b = blended_rgb[idx]
+        lut[idx] = f"#{r:02x}{g:02x}{b:02x}"
+    return lut
+
+_COLOR_LUT = _build_color_lut()
+
 def _interpolate_color(emotion_vector: np.ndarray) -> str:
     """
     Interpolate glow color based on emotion blend
@@ -306,20 +523,11 @@ def _interpolate_color(emotion_vector: np.ndarray) -> str:
     Calm → warm amber (#F59E42)
     Guarded → cool blue (#4A90E2)
     Lit → vivid green (#7ED321)
-    """
-    calm, guarded, lit = emotion_vector
-    
-    # RGB values
-    amber = np.array([245, 158, 66])   # Calm
-    blue = np.array([74, 144, 226])    # Guarded
-    green = np.array([126, 211, 33])   # Lit
     
-    # Weighted blend
-    blended_rgb = calm * amber + guarded * blue + lit * green
-    blended_rgb = np.clip(blended_rgb, 0, 255).astype(int)
-    
-    # Convert to hex
-    return f"#{blended_rgb[0]:02x}{blended_rgb[1]:02x}{blended_rgb[2]:02x}"
+    Looks up the precomputed color of the nearest LUT bin
+    """
+    calm, guarded, lit = np.rint(np.clip(emotion_vector, 0.0, 1.0) * (COLOR_LUT_BINS - 1)).astype(int)
+    return str(_COLOR_LUT[calm, guarded, lit])
 
 def _detect_emotion_blend(emotion_vector: np.ndarray) -> str:
     """
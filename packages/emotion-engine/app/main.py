@@ -7,7 +7,7 @@ Returns blended emotion vectors for smooth TTS and avatar modulation
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from app.inference import predict_emotion, predict_emotion_blended
+from app.inference import load_models, predict_emotion, predict_emotion_blended
 from app.schemas import EmotionResponse, BlendedEmotionResponse, HealthResponse
 import uvicorn
 
@@ -26,6 +26,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def startup():
+    """Load models once before serving requests"""
+    load_models()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -6,6 +6,7 @@ Emotion classifier neural network
 
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 class EmotionClassifier(nn.Module):
     """
@@ -14,21 +15,17 @@ class EmotionClassifier(nn.Module):
     Architecture:
     - Input: 1536d (768 audio + 768 text)
     - Dense(1536 → 512) + ReLU
-    - Dropout(0.2)
-    - Dense(512 → 3) + Sigmoid
-    - Output: [calm, guarded, lit] probabilities
+    - Dropout(0.2) (training only)
+    - Dense(512 → 3) + Softmax
+    - Output: [calm, guarded, lit] probability distribution
     """
     
     def __init__(self, input_dim: int = 1536, hidden_dim: int = 512, output_dim: int = 3):
         super().__init__()
         
-        self.classifier = nn.Sequential(
-            nn.Linear(input_dim, hidden_dim),
-            nn.ReLU(),
-            nn.Dropout(0.2),
-            nn.Linear(hidden_dim, output_dim),
-            nn.Sigmoid()
-        )
+        self.w1 = nn.Linear(input_dim, hidden_dim)
+        self.w2 = nn.Linear(hidden_dim, output_dim)
+        self.dropout = 0.2
     
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         """
@@ -38,9 +35,64 @@ class EmotionClassifier(nn.Module):
             x: Fused features (batch_size, 1536)
             
         Returns:
-            Emotion probabilities (batch_size, 3)
+            Emotion probabilities summing to 1 (batch_size, 3)
         """
-        return self.classifier(x)
+        h = F.relu(self.w1(x))
+        if self.training:
+            h = F.dropout(h, self.dropout, training=True)
+        return F.softmax(self.w2(h), dim=-1)
+    
+    # Checkpoints saved before w1/w2 used an nn.Sequential named classifier
+    _LEGACY_KEYS = {"classifier.0.": "w1.", "classifier.3.": "w2."}
+    
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        """Rename legacy classifier.0 / classifier.3 keys so old checkpoints still load"""
+        for key in [k for k in state_dict if k.startswith(prefix + "classifier.")]:
+            for old, new in self._LEGACY_KEYS.items():
+                if key.startswith(prefix + old):
+                    state_dict[prefix + new + key[len(prefix + old):]] = state_dict.pop(key)
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+class SelfAttention(nn.Module):
+    """
+    Multi-head self-attention on F.scaled_dot_product_attention
+    
+    Uses a fused QKV projection and lets PyTorch pick the flash or
+    memory-efficient kernel, instead of nn.MultiheadAttention's explicit
+    softmax path
+    """
+    
+    def __init__(self, dim: int, num_heads: int = 8, dropout: float = 0.0):
+        super().__init__()
+        
+        assert dim % num_heads == 0, "dim must be divisible by num_heads"
+        self.num_heads = num_heads
+        self.head_dim = dim // num_heads
+        self.dropout = dropout
+        
+        self.qkv = nn.Linear(dim, 3 * dim)
+        self.out_proj = nn.Linear(dim, dim)
+    
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Args:
+            x: Token embeddings (batch_size, seq_len, dim)
+            
+        Returns:
+            Attended embeddings (batch_size, seq_len, dim)
+        """
+        B, L, D = x.shape
+        
+        # (B, L, 3D) -> 3 x (B, num_heads, L, head_dim)
+        q, k, v = self.qkv(x).view(B, L, 3, self.num_heads, self.head_dim).permute(2, 0, 3, 1, 4)
+        
+        attn = F.scaled_dot_product_attention(
+            q, k, v,
+            dropout_p=self.dropout if self.training else 0.0,
+            is_causal=False,
+        )
+        
+        return self.out_proj(attn.transpose(1, 2).reshape(B, L, D))
 
 class AttentionFusionClassifier(nn.Module):
     """
@@ -53,8 +105,8 @@ class AttentionFusionClassifier(nn.Module):
         super().__init__()
         
         # Cross-modal attention
-        self.audio_attention = nn.MultiheadAttention(audio_dim, num_heads=8)
-        self.text_attention = nn.MultiheadAttention(text_dim, num_heads=8)
+        self.audio_attention = SelfAttention(audio_dim, num_heads=8)
+        self.text_attention = SelfAttention(text_dim, num_heads=8)
         
         # Fusion layers
         self.fusion = nn.Sequential(
@@ -70,18 +122,78 @@ class AttentionFusionClassifier(nn.Module):
         Forward pass with attention
         
         Args:
-            audio_feat: Audio embeddings (batch_size, 768)
-            text_feat: Text embeddings (batch_size, 768)
+            audio_feat: Audio embeddings (batch_size, 768) or frames (batch_size, seq_len, 768)
+            text_feat: Text embeddings (batch_size, 768) or tokens (batch_size, seq_len, 768)
             
         Returns:
             Emotion probabilities (batch_size, 3)
         """
-        # Self-attention
-        audio_attn, _ = self.audio_attention(audio_feat, audio_feat, audio_feat)
-        text_attn, _ = self.text_attention(text_feat, text_feat, text_feat)
+        # Pooled embeddings are a single token per sample
+        if audio_feat.dim() == 2:
+            audio_feat = audio_feat.unsqueeze(1)
+        if text_feat.dim() == 2:
+            text_feat = text_feat.unsqueeze(1)
+        
+        # Self-attention, then mean over the sequence
+        audio_attn = self.audio_attention(audio_feat).mean(dim=1)
+        text_attn = self.text_attention(text_feat).mean(dim=1)
         
         # Concatenate attended features
         fused = torch.cat((audio_attn, text_attn), dim=-1)
         
         # Classify
         return self.fusion(fused)
+
+def export_onnx(model: nn.Module, path: str, input_dim: int = 1536, opset_version: int = 17):
+    """
+    Export a fusion classifier to ONNX with a dynamic batch axis
+    
+    Args:
+        model: Classifier taking fused features (batch_size, input_dim)
+        path: Output .onnx file
+        input_dim: Fused feature size
+        opset_version: ONNX opset
+    """
+    model.eval()
+    torch.onnx.export(
+        model,
+        torch.randn(1, input_dim),
+        path,
+        input_names=["input"],
+        output_names=["probs"],
+        dynamic_axes={"input": {0: "B"}, "probs": {0: "B"}},
+        opset_version=opset_version,
+    )
+
+def quantize_classifier(model: nn.Module, calibration: tuple = None, min_correlation: float = 0.99) -> nn.Module:
+    """
+    Dynamic int8 quantization of a classifier's nn.Linear layers (CPU inference)
+    
+    Weights are stored as int8 and activations are scaled at runtime, so
+    inputs stay FP32. When calibration inputs are given, the quantized
+    outputs must keep at least min_correlation Pearson correlation with the
+    FP32 outputs, otherwise the FP32 model is returned.
+    
+    Args:
+        model: EmotionClassifier or AttentionFusionClassifier in eval mode
+        calibration: Tuple of forward() inputs used to validate the quantized model
+        min_correlation: Minimum Pearson correlation with FP32 outputs
+        
+    Returns:
+        Quantized model, or the original model if validation fails
+    """
+    quantized = torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    
+    if calibration is None:
+        return quantized
+    
+    with torch.inference_mode():
+        reference = model(*calibration).flatten()
+        candidate = quantized(*calibration).flatten()
+    
+    correlation = torch.corrcoef(torch.stack((reference, candidate)))[0, 1].item()
+    if correlation < min_correlation:
+        print(f"Quantized classifier correlation {correlation:.4f} < {min_correlation}, keeping FP32")
+        return model
+    
+    return quantized
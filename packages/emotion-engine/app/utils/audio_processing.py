@@ -4,101 +4,451 @@ Audio preprocessing utilities
 Waveform loading, resampling, feature extraction
 """
 
+import functools
+import os
+import queue
+import sys
 import torch
+import torch.multiprocessing as mp
 import torchaudio
 import numpy as np
-from typing import Tuple
+from numba import njit
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 
 TARGET_SAMPLE_RATE = 16000
 
-def load_audio(file_path: str) -> Tuple[torch.Tensor, int]:
+def load_audio(file_path: str, device: Optional[str] = None) -> Tuple[torch.Tensor, int]:
     """
     Load audio file and return waveform + sample rate
     
+    Decodes with the soundfile backend (libsndfile). When the target is a
+    CUDA device the waveform is staged in pinned memory, so the copy is
+    truly asynchronous and overlaps with whatever runs next.
+    
     Args:
         file_path: Path to audio file
+        device: Move the raw waveform here (e.g. "cuda") so resampling and
+            normalization run on that device with a single host copy
         
     Returns:
         (waveform, sample_rate)
     """
-    waveform, sr = torchaudio.load(file_path)
+    waveform, sr = torchaudio.load(file_path, backend="soundfile")
+    if device is not None:
+        if torch.device(device).type == "cuda":
+            waveform = waveform.pin_memory()
+        waveform = waveform.to(device, non_blocking=True)
     return waveform, sr
 
-def resample_audio(waveform: torch.Tensor, original_sr: int, target_sr: int = TARGET_SAMPLE_RATE) -> torch.Tensor:
+@functools.lru_cache(maxsize=16)
+def _get_resampler(orig_sr: int, target_sr: int, dtype: torch.dtype = torch.float32, device: str = "cpu") -> torchaudio.transforms.Resample:
+    """
+    Build (once) a Resample transform for a sample rate pair
+    
+    Constructing Resample computes its sinc kernel, so instances are cached
+    per (orig_sr, target_sr, dtype, device) and reused across calls
+    """
+    return torchaudio.transforms.Resample(orig_sr, target_sr, dtype=dtype).to(device)
+
+def resample_audio(waveform: torch.Tensor, original_sr: int, target_sr: int = TARGET_SAMPLE_RATE, device: Optional[str] = None) -> torch.Tensor:
     """
     Resample audio to target sample rate
     
+    The filter runs on the waveform's device (a conv1d on GPU for CUDA
+    tensors), using a transform cached for that device.
+    
     Args:
         waveform: Audio tensor
         original_sr: Original sample rate
         target_sr: Target sample rate (default 16kHz for Wav2Vec2)
+        device: Move the waveform here first
         
     Returns:
         Resampled waveform
     """
+    if device is not None:
+        waveform = waveform.to(device, non_blocking=True)
+    
     if original_sr == target_sr:
         return waveform
     
-    resampler = torchaudio.transforms.Resample(original_sr, target_sr)
+    resampler = _get_resampler(original_sr, target_sr, waveform.dtype, str(waveform.device))
     return resampler(waveform)
 
-def normalize_audio(waveform: torch.Tensor) -> torch.Tensor:
+# Most uploads are 44.1kHz or 48kHz
+for _sr in (44100, 48000):
+    _get_resampler(_sr, TARGET_SAMPLE_RATE, torch.float32, "cpu")
+
+def normalize_audio(waveform: torch.Tensor, device: Optional[str] = None, inplace: bool = False) -> torch.Tensor:
     """
     Normalize audio to [-1, 1] range
     
     Args:
         waveform: Audio tensor
+        device: Move the waveform here first
+        inplace: Scale the waveform in place instead of allocating a new tensor
         
     Returns:
         Normalized waveform
     """
-    max_val = torch.abs(waveform).max()
+    if device is not None:
+        waveform = waveform.to(device, non_blocking=True)
+    
+    # Peak amplitude in a single reduction, without materializing |waveform|
+    max_val = torch.linalg.vector_norm(waveform, ord=float("inf")).item()
     if max_val > 0:
-        return waveform / max_val
+        scale = 1.0 / max_val
+        return waveform.mul_(scale) if inplace else waveform.mul(scale)
     return waveform
 
-def compute_rms_energy(waveform: torch.Tensor) -> float:
+@njit(cache=True)
+def _zcr_swar(x_u32: np.ndarray) -> int:
+    """
+    Branchless zero-crossing count over float32 samples viewed as uint32
+    
+    Adjacent sign bits are XORed and summed, so there is no data-dependent
+    branch per sample and the loop can vectorize
+    """
+    n = x_u32.shape[0]
+    if n == 0:
+        return 0
+    
+    acc = 0
+    prev = x_u32[0] >> 31
+    for i in range(1, n):
+        cur = x_u32[i] >> 31
+        acc += cur ^ prev
+        prev = cur
+    return acc
+
+@njit(cache=True, fastmath=True)
+def _acoustic_kernel(x: np.ndarray) -> Tuple[float, int]:
+    """
+    Sum of squares and zero-crossing count in one pass over a 1-D float32 buffer
+    
+    Sign changes are counted branchlessly from the IEEE sign bit (as in
+    _zcr_swar)
+    
+    Returns:
+        (sum of squares, number of sign changes)
+    """
+    n = x.shape[0]
+    s = 0.0
+    zc = 0
+    if n == 0:
+        return s, zc
+    
+    u = x.view(np.uint32)
+    prev = u[0] >> 31
+    s += x[0] * x[0]
+    for i in range(1, n):
+        s += x[i] * x[i]
+        cur = u[i] >> 31
+        zc += cur ^ prev
+        prev = cur
+    return s, zc
+
+@torch.jit.script
+def _zcr_torch(waveform: torch.Tensor) -> torch.Tensor:
+    """Sign-bit zero-crossing count in torch ops (0-d int64 tensor on the waveform's device)"""
+    # signbit reads the IEEE sign bit directly, same as the uint32 view on the CPU path
+    signs = torch.signbit(waveform.reshape(-1))
+    return torch.ne(signs[1:], signs[:-1]).sum()
+
+@torch.jit.script
+def _rms_torch(waveform: torch.Tensor) -> torch.Tensor:
+    """RMS as a 0-d tensor on the waveform's device"""
+    x = waveform.reshape(-1).to(torch.float32)
+    return torch.linalg.vector_norm(x) / (x.numel() ** 0.5)
+
+def _as_float32_array(waveform: torch.Tensor) -> np.ndarray:
+    """Flatten a waveform to a contiguous float32 numpy buffer (no copy for CPU float32)"""
+    x = waveform.detach().cpu().numpy().reshape(-1)
+    return np.ascontiguousarray(x, dtype=np.float32)
+
+def compute_rms_energy(waveform: torch.Tensor, as_tensor: bool = False) -> Union[float, torch.Tensor]:
     """
     Compute RMS energy of audio
     
     Args:
         waveform: Audio tensor
+        as_tensor: Return a 0-d tensor on the waveform's device instead of
+            a float, so GPU callers don't sync per clip (see materialize)
         
     Returns:
         RMS energy (scalar)
     """
-    return torch.sqrt(torch.mean(waveform ** 2)).item()
+    n = waveform.numel()
+    if n == 0:
+        return torch.zeros((), device=waveform.device) if as_tensor else 0.0
+    
+    if waveform.device.type != "cpu":
+        energy = _rms_torch(waveform)
+        return energy if as_tensor else energy.item()
+    
+    s, _ = _acoustic_kernel(_as_float32_array(waveform))
+    energy = float(np.sqrt(s / n))
+    return torch.tensor(energy) if as_tensor else energy
 
-def compute_zcr(waveform: torch.Tensor) -> float:
+def compute_zcr(waveform: torch.Tensor, as_tensor: bool = False) -> Union[float, torch.Tensor]:
     """
     Compute zero-crossing rate
     
     Args:
         waveform: Audio tensor
+        as_tensor: Return a 0-d tensor on the waveform's device instead of
+            a float, so GPU callers don't sync per clip (see materialize)
         
     Returns:
         Zero-crossing rate (scalar)
     """
-    waveform_np = waveform.squeeze().numpy()
-    zcr = np.sum(np.abs(np.diff(np.sign(waveform_np)))) / (2 * len(waveform_np))
-    return float(zcr)
+    n = waveform.numel()
+    if n == 0:
+        return torch.zeros((), device=waveform.device) if as_tensor else 0.0
+    
+    # Count on the tensor's own device rather than copying it back to numpy
+    if waveform.device.type != "cpu":
+        zcr = _zcr_torch(waveform) / n
+        return zcr if as_tensor else zcr.item()
+    
+    zcr = _zcr_swar(_as_float32_array(waveform).view(np.uint32)) / n
+    return torch.tensor(zcr) if as_tensor else zcr
 
-def extract_acoustic_features(waveform: torch.Tensor, sr: int) -> dict:
+def extract_acoustic_features(waveform: torch.Tensor, sr: int, as_tensor: bool = False) -> dict:
     """
     Extract simple acoustic features for rule-based heuristics
     
     Args:
         waveform: Audio tensor
         sr: Sample rate
+        as_tensor: Leave energy and zcr as 0-d tensors; call materialize()
+            once for the whole batch instead of syncing per clip
         
     Returns:
         Dictionary of acoustic features
     """
-    energy = compute_rms_energy(waveform)
-    zcr = compute_zcr(waveform)
+    n = waveform.numel()
+    duration = waveform.shape[-1] / sr
+    
+    if waveform.device.type != "cpu" and n:
+        features = {
+            "energy": _rms_torch(waveform),
+            "zcr": _zcr_torch(waveform) / n,
+            "duration": duration,
+        }
+        return features if as_tensor else materialize(features)
+    
+    # Energy and ZCR share one pass over the samples
+    s, zc = _acoustic_kernel(_as_float32_array(waveform))
+    energy = float(np.sqrt(s / n)) if n else 0.0
+    zcr = zc / n if n else 0.0
+    
+    if as_tensor:
+        return {"energy": torch.tensor(energy), "zcr": torch.tensor(zcr), "duration": duration}
+    return {"energy": energy, "zcr": zcr, "duration": duration}
+
+def materialize(features: Union[dict, List[dict]]) -> Union[dict, List[dict]]:
+    """
+    Convert tensor feature values to Python floats with a single device sync
+    
+    Args:
+        features: One feature dict, or a batch of them, from
+            extract_acoustic_features(..., as_tensor=True)
+        
+    Returns:
+        The same structure with floats in place of 0-d tensors
+    """
+    batch = [features] if isinstance(features, dict) else features
+    slots = [
+        (i, key) for i, item in enumerate(batch)
+        for key, value in item.items() if isinstance(value, torch.Tensor)
+    ]
+    
+    result = [dict(item) for item in batch]
+    if slots:
+        # Gather on one device so the whole batch costs one transfer
+        target = batch[slots[0][0]][slots[0][1]].device
+        values = torch.stack([batch[i][key].to(target, torch.float32) for i, key in slots]).tolist()
+        for (i, key), value in zip(slots, values):
+            result[i][key] = value
+    
+    return result[0] if isinstance(features, dict) else result
+
+def _load_worker(path_queue, slice_queue, num_workers: int):
+    """Loader process: decode files from path_queue onto slice_queue"""
+    torch.set_num_threads(1)
+    while True:
+        item = path_queue.get()
+        if item is None:
+            break
+        
+        index, file_path = item
+        try:
+            waveform, sr = load_audio(file_path)
+            # Sent by value: torch's fd-based tensor sharing needs this
+            # process alive until every slice is received
+            slice_queue.put((index, waveform.numpy(), sr, None))
+        except Exception as e:
+            slice_queue.put((index, None, None, str(e)))
+    
+    # One stop signal per feature worker
+    for _ in range(num_workers):
+        slice_queue.put(None)
+
+def _feature_worker(slice_queue, output_queue, target_sr: int):
+    """Feature process: resample, normalize and extract features for each slice"""
+    # One BLAS/OpenMP thread per process, otherwise workers oversubscribe the cores
+    torch.set_num_threads(1)
+    while True:
+        item = slice_queue.get()
+        if item is None:
+            output_queue.put(None)
+            break
+        
+        index, waveform, sr, error = item
+        if error is None:
+            try:
+                waveform = torch.from_numpy(waveform)
+                waveform = normalize_audio(resample_audio(waveform, sr, target_sr), inplace=True)
+                output_queue.put((index, extract_acoustic_features(waveform, target_sr)))
+                continue
+            except Exception as e:
+                error = str(e)
+        output_queue.put((index, {"error": error}))
+
+class AudioPreprocessingPipeline:
+    """
+    Two-stage multiprocess preprocessing for batches of audio files
+    
+    A loader process decodes files into a bounded slice queue; feature
+    worker processes pull slices and run resample -> normalize ->
+    extract_acoustic_features, so file I/O overlaps with compute and the
+    DSP runs on every core. Workers are forked on Linux and inherit the
+    cached Resample transforms.
+    
+    CPU only: create the pipeline before CUDA is initialized in this process.
+    
+    Single use: results() (and so run()) closes the pipeline, after which
+    submit() raises. Create a new pipeline for the next batch of files.
+    
+    Usage:
+        with AudioPreprocessingPipeline() as pipeline:
+            features = pipeline.run(paths)
+    """
+    
+    def __init__(self, num_workers: Optional[int] = None, queue_size: int = 32, target_sr: int = TARGET_SAMPLE_RATE):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.target_sr = target_sr
+        
+        ctx = mp.get_context("fork" if sys.platform.startswith("linux") else "spawn")
+        self.path_queue = ctx.Queue()
+        self.slice_queue = ctx.Queue(maxsize=queue_size)
+        self.output_queue = ctx.Queue()
+        
+        self.processes = [
+            ctx.Process(target=_load_worker, args=(self.path_queue, self.slice_queue, self.num_workers), daemon=True)
+        ] + [
+            ctx.Process(target=_feature_worker, args=(self.slice_queue, self.output_queue, target_sr), daemon=True)
+            for _ in range(self.num_workers)
+        ]
+        self.submitted = 0
+        self.started = False
+        self.closed = False
+        self.finished = False
+    
+    def start(self):
+        """Start the loader and feature worker processes"""
+        if not self.started:
+            for process in self.processes:
+                process.start()
+            self.started = True
+    
+    def submit(self, file_path: str) -> int:
+        """
+        Queue a file for preprocessing
+        
+        Returns:
+            Index identifying this file in results()
+            
+        Raises:
+            RuntimeError: If the pipeline has already been closed
+        """
+        if self.closed:
+            raise RuntimeError("AudioPreprocessingPipeline is closed; create a new one")
+        self.start()
+        index = self.submitted
+        self.path_queue.put((index, file_path))
+        self.submitted += 1
+        return index
+    
+    def close(self):
+        """Signal that no more files will be submitted"""
+        if not self.closed:
+            self.start()
+            self.path_queue.put(None)
+            self.closed = True
+    
+    def results(self, poll_interval: float = 1.0) -> Iterator[Tuple[int, dict]]:
+        """
+        Yield (index, features) as workers finish, in completion order
+        
+        Closes the pipeline and runs until every worker has stopped. Failed
+        files yield {"error": message}.
+        
+        Raises:
+            RuntimeError: If a worker process dies (e.g. OOM-killed), since
+                the files it held can no longer complete
+        """
+        self.close()
+        if self.finished:
+            return
+        
+        remaining = self.num_workers
+        while remaining:
+            try:
+                item = self.output_queue.get(timeout=poll_interval)
+            except queue.Empty:
+                dead = [p for p in self.processes if p.exitcode not in (None, 0)]
+                if dead:
+                    raise RuntimeError(
+                        f"Preprocessing worker {dead[0].name} exited with code {dead[0].exitcode}"
+                    )
+                continue
+            
+            if item is None:
+                remaining -= 1
+            else:
+                yield item
+        
+        self.finished = True
+    
+    def run(self, file_paths: Iterable[str]) -> List[dict]:
+        """
+        Preprocess files and return their features in input order
+        
+        Args:
+            file_paths: Audio files to process
+            
+        Returns:
+            One feature dict (or {"error": ...}) per file
+        """
+        indices = [self.submit(path) for path in file_paths]
+        features = dict(self.results())
+        return [features[index] for index in indices]
+    
+    def join(self, timeout: Optional[float] = None):
+        """Wait for the worker processes to exit"""
+        for process in self.processes:
+            if process.is_alive():
+                process.join(timeout)
+    
+    def __enter__(self):
+        self.start()
+        return self
     
-    return {
-        "energy": energy,
-        "zcr": zcr,
-        "duration": waveform.shape[-1] / sr
-    }
+    def __exit__(self, *exc):
+        self.close()
+        self.join(timeout=5)
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
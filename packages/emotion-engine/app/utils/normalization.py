@@ -6,44 +6,129 @@ Feature scaling and standardization
 
 import numpy as np
 import torch
+from numba import njit
 from typing import Optional
 
+@njit(cache=True, fastmath=True)
+def _welford_update(mean, M2, count, x):
+    """Fold one observation x into mean and M2 in place; returns the new count"""
+    count += 1
+    for j in range(x.shape[0]):
+        delta = x[j] - mean[j]
+        mean[j] += delta / count
+        M2[j] += delta * (x[j] - mean[j])
+    return count
+
+@njit(cache=True, fastmath=True)
+def _welford_update_rows(mean, M2, count, rows):
+    """Fold each row of a (batch_size, feature_dim) array in with _welford_update"""
+    for i in range(rows.shape[0]):
+        count = _welford_update(mean, M2, count, rows[i])
+    return count
+
 class FeatureScaler:
     """
     Online feature scaler with running statistics
+    
+    Uses Welford's algorithm: the running sum of squared deviations (M2)
+    is kept instead of the std, so the variance stays numerically stable
+    and accounts for mean shifts between batches. mean and M2 are
+    separate contiguous float64 arrays updated in place by a numba
+    kernel, so per-sample streaming updates run without Python overhead.
+    
+    The statistics used by transform() can be stored in a narrower dtype
+    (np.float16) to halve the bytes read per call; the running sums always
+    stay float64, since M2 would overflow float16.
     """
     
-    def __init__(self, feature_dim: int):
+    def __init__(self, feature_dim: int, storage_dtype: np.dtype = np.float64):
         self.feature_dim = feature_dim
+        self.storage_dtype = np.dtype(storage_dtype)
         self.mean = np.zeros(feature_dim)
-        self.std = np.ones(feature_dim)
+        self.M2 = np.zeros(feature_dim)
         self.count = 0
+        self._refresh_stored()
+    
+    @property
+    def std(self) -> np.ndarray:
+        """Population std of everything seen so far (ones before the first update)"""
+        if self.count == 0:
+            return np.ones(self.feature_dim)
+        return np.sqrt(self.M2 / self.count)
     
     def update(self, features: np.ndarray):
-        """Update running statistics"""
-        batch_mean = features.mean(axis=0)
-        batch_std = features.std(axis=0)
-        
-        # Online update
-        n = self.count
-        m = len(features)
+        """Update running statistics with a batch (batch_size, feature_dim) or a single sample"""
+        rows = np.atleast_2d(np.asarray(features, dtype=np.float64))
+        # The kernel indexes without bounds checks, so shapes must be exact
+        if rows.ndim != 2 or rows.shape[1] != self.feature_dim:
+            raise ValueError(f"Expected features of shape (batch_size, {self.feature_dim}), got {np.shape(features)}")
+        if rows.shape[0] == 0:
+            return
         
-        self.mean = (n * self.mean + m * batch_mean) / (n + m)
-        self.std = np.sqrt((n * self.std**2 + m * batch_std**2) / (n + m))
-        self.count += m
+        self.count = _welford_update_rows(self.mean, self.M2, self.count, rows)
+        self._refresh_stored()
+    
+    def _refresh_stored(self):
+        """Precompute mean and 1 / (std + eps) for transform(), cast to storage_dtype"""
+        # Clamped so float16 storage holds a finite scale for constant features
+        inv_std = np.minimum(1.0 / (self.std + 1e-8), np.finfo(self.storage_dtype).max)
+        self._stored_mean = self.mean.astype(self.storage_dtype)
+        self._inv_std = inv_std.astype(self.storage_dtype)
     
-    def transform(self, features: np.ndarray) -> np.ndarray:
-        """Apply z-score normalization"""
-        return (features - self.mean) / (self.std + 1e-8)
+    def transform(self, features: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Apply z-score normalization as (features - mean) * inv_std
+        
+        Computed in the wider of features' and the storage dtype.
+        
+        Args:
+            features: Feature rows (batch_size, feature_dim)
+            out: Buffer to write the result into (may be features itself)
+            
+        Returns:
+            Standardized features
+        """
+        out = np.subtract(features, self._stored_mean, out=out)
+        return np.multiply(out, self._inv_std, out=out)
+
+@njit(cache=True, fastmath=True)
+def _smooth_kernel(current, previous, alpha, out):
+    for i in range(current.shape[0]):
+        out[i] = alpha * current[i] + (1 - alpha) * previous[i]
+
+@njit(cache=True, fastmath=True, error_model="numpy")
+def _interpolate_kernel(start, end, t, out):
+    total = 0.0
+    for i in range(start.shape[0]):
+        v = (1 - t) * start[i] + t * end[i]
+        out[i] = v
+        total += v
+    for i in range(out.shape[0]):
+        out[i] /= total
 
-def smooth_temporal(current: np.ndarray, previous: Optional[np.ndarray], alpha: float = 0.7) -> np.ndarray:
+def _check_shapes(a: np.ndarray, b: np.ndarray, out: Optional[np.ndarray]):
+    """The kernels index without bounds checks, so validate shapes up front"""
+    if a.shape != b.shape:
+        raise ValueError(f"Emotion vectors differ in shape: {a.shape} vs {b.shape}")
+    if out is not None:
+        if out.shape != a.shape:
+            raise ValueError(f"out has shape {out.shape}, expected {a.shape}")
+        if not out.flags.c_contiguous:
+            raise ValueError("out must be C-contiguous")
+
+def smooth_temporal(current: np.ndarray, previous: Optional[np.ndarray], alpha: float = 0.7, out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Temporal smoothing for emotion vectors
     
+    Runs as a numba loop: emotion vectors are only a handful of elements,
+    so numpy's per-op dispatch would cost more than the arithmetic.
+    
     Args:
         current: Current emotion vector
         previous: Previous emotion vector
         alpha: Smoothing factor (0.7 = 70% current, 30% previous)
+        out: Buffer to write the result into; may be previous itself to
+            update a running state in place
         
     Returns:
         Smoothed emotion vector
@@ -51,21 +136,38 @@ def smooth_temporal(current: np.ndarray, previous: Optional[np.ndarray], alpha:
     if previous is None:
         return current
     
-    return alpha * current + (1 - alpha) * previous
+    _check_shapes(current, previous, out)
+    if out is None:
+        out = np.empty(current.shape, dtype=np.result_type(current, previous, np.float32))
+    _smooth_kernel(current.reshape(-1), previous.reshape(-1), alpha, out.reshape(-1))
+    return out
 
-def interpolate_emotion_vector(start: np.ndarray, end: np.ndarray, t: float) -> np.ndarray:
+def interpolate_emotion_vector(start: np.ndarray, end: np.ndarray, t: float, out: Optional[np.ndarray] = None, assume_simplex: bool = True) -> np.ndarray:
     """
     Linear interpolation between emotion vectors
     
+    If start and end are probability vectors (each sums to 1), so is any
+    convex combination of them, and the renormalization is skipped: the
+    call is a single axpby. Otherwise the blend and the sum-to-1
+    normalization run in one numba kernel.
+    
     Args:
         start: Starting emotion vector
         end: Ending emotion vector
         t: Interpolation parameter (0-1)
+        out: Buffer to write the result into; may be start itself
+        assume_simplex: start and end already sum to 1
         
     Returns:
-        Interpolated emotion vector
+        Interpolated emotion vector, normalized to sum to 1 (NaN if the
+        blend sums to 0 and assume_simplex is False)
     """
-    interpolated = (1 - t) * start + t * end
+    _check_shapes(start, end, out)
+    if out is None:
+        out = np.empty(start.shape, dtype=np.result_type(start, end, np.float32))
     
-    # Normalize to ensure sum = 1
-    return interpolated / interpolated.sum()
+    if assume_simplex:
+        _smooth_kernel(end.reshape(-1), start.reshape(-1), t, out.reshape(-1))
+    else:
+        _interpolate_kernel(start.reshape(-1), end.reshape(-1), t, out.reshape(-1))
+    return out